@@ -1,173 +1,85 @@
-from mcts_node import MCTSNode
+from mcts_search import search
 from p2_t3 import Board
-from random import choice
-from math import sqrt, log, e
+from array import array
 
+# Search settings, passed to mcts_search.search; its docstring describes each of them.
 num_nodes = 200
 explore_faction = 2.
+num_workers = 1
+think_time = None
+reuse_tree = True
 
+# Bitmasks of the 8 rows, columns and diagonals of a 3x3 board, with square (r, c) at bit 3 * r + c.
+LINE_MASKS = (0b000000111, 0b000111000, 0b111000000,
+              0b001001001, 0b010010010, 0b100100100,
+              0b100010001, 0b001010100)
+# Best square for the mover and its score, indexed by mover_mask << 9 | other_mask of a sub-board. Built on the
+# first rollout by _build_move_tables.
+BEST_CELL = None
+BEST_SCORE = None
 
-def calculates_score(node: MCTSNode, child: MCTSNode):
-    wins = child.wins
-    visits = child.visits
-    total_visits = node.visits
-    exploitation_factor = (wins / visits)
-    exploration_factor = explore_faction * sqrt(log(total_visits, e) / visits)
-    value = exploitation_factor + exploration_factor
-    return value
 
-
-def traverse_nodes(node: MCTSNode, board: Board, state, bot_identity: int):
-    """ Traverses the tree until the end criterion are met.
-    e.g. find the best expandable node (node with untried action) if it exist,
-    or else a terminal node
+def get_heuristic(player_mask, other_mask):
+    """ Scores a 3x3 sub-board from the perspective of the player holding player_mask, whichever side the bot
+    plays. Swapping the two masks negates the score.
 
     Args:
-        node:       A tree node from which the search is traversing.
-        board:      The game setup.
-        state:      The state of the game.
-        bot_identity:   The bot's identity, either 1 or 2
+        player_mask:    The 9-bit mask of the squares held by the player being scored.
+        other_mask:     The 9-bit mask of the squares held by the other player.
 
     Returns:
-        node: A node from which the next stage of the search can proceed.
-        state: The state associated with that node
+        8 or -8 if the player or the other player owns a full line, otherwise the number of lines still open to
+        the player minus the number still open to the other player.
 
     """
-
-    # from lecture slides: Walk the game tree picking child nodes with the highest value of this formula. Return a node with untried actions to expand.
-    # stopping criteria: no node has untried actions OR game has ended
-    if not node.child_nodes:
-        return node, state
-    is_opponent = board.current_player(state) != bot_identity
-    while node is not None:
-        # for each node,
-        # find expandable node
-        # else find the child with the UBC highest value,
-        # and traverse that child
-
-        # node with possible actions
-        if node.untried_actions:
-            return node, state
-
-        #terminal node
-        if not node.untried_actions and not node.child_nodes:
-            return node, state
-
-        best_node = node
-        best_action = None
-        best_score = float('-inf')
-        children = node.child_nodes
-        is_opponent = not is_opponent
-        for action, child in children.items():
-            score = ucb(child, is_opponent)
-            if score > best_score:
-                best_score = score
-                best_node = child
-                best_action = action
-        node = best_node
-        state = board.next_state(state, best_action)
-
-    return node, state
-
-
-def expand_leaf(node: MCTSNode, board: Board, state):
-    """ Adds a new leaf to the tree by creating a new child node for the given node (if it is non-terminal).
-
-    Args:
-        node:   The node for which a child will be added.
-        board:  The game setup.
-        state:  The state of the game.
-
-    Returns:
-        node: The added child node
-        state: The state associated with that node
+    # An empty line is open to both players and cancels out, and a contested line is open to neither, so only
+    # the lines held by exactly one player move the score.
+    score = 0
+    for m in LINE_MASKS:
+        pm = player_mask & m
+        om = other_mask & m
+        if pm:
+            if pm == m:
+                return 8
+            if not om:
+                score += 1
+        elif om:
+            if om == m:
+                return -8
+            score -= 1
+    return score
+
+def _build_move_tables():
+    """ Fills BEST_CELL and BEST_SCORE for every sub-board position with an empty square, so the greedy rollout
+    can pick its move in a sub-board with one lookup instead of scoring each empty square.
 
     """
-    # check that node is non-terminal
-    if node.untried_actions:
-        action = choice(node.untried_actions)
-        new_state = board.next_state(state, action)
-        child_actions = board.legal_actions(new_state)  # node.untried_actions.remove(action)
-        child = MCTSNode(parent=node, parent_action=action, action_list=child_actions)
-        node.child_nodes.update({action: child})
-        node.untried_actions.remove(action)
-        return child, new_state
-    return None, state
-
-def get_heuristic(board_state, bot_identity):
-    player = bot_identity
-    bot = 1
-    if player==1:
-        bot = 2
-    player_score = 0
-    bot_score = 0
-    for r in range(3):
-        row = [board_state[(r, 0)], board_state[(r, 1)], board_state[(r, 2)]]
-        if player in row and bot in row:
-            continue
-        elif player in row:
-            player_score += 1
-        elif bot in row:
-            bot_score += 1
-        else:
-            player_score += 1
-            bot_score += 1 
-
-    for c in range(3):
-        col = [board_state[(0, c)], board_state[(1, c)], board_state[(2, c)]]
-        if player in col and bot in col:
-            continue
-        elif player in col:
-            player_score += 1
-        elif bot in col:
-            bot_score += 1
-        else:
-            player_score += 1
-            bot_score += 1 
-        
-    diag = [board_state[(0, 0)], board_state[(1, 1)], board_state[(2, 2)]]
-    if player in diag and bot in diag:
-        pass
-    elif player in diag:
-        player_score += 1
-    elif bot in diag:
-        bot_score += 1
-    else:
-        player_score += 1
-        bot_score += 1 
-    
-    diag = [board_state[(0, 2)], board_state[(1, 1)], board_state[(2, 0)]]
-    if player in diag and bot in diag:
-        pass
-    elif player in diag:
-        player_score += 1
-    elif bot in diag:
-        bot_score += 1
-    else:
-        player_score += 1
-        bot_score += 1 
-    return player_score - bot_score
-
-positions = dict(
-    ((r, c), 1 << (3 * r + c))
-    for r in range(3)
-    for c in range(3)
-)
-
-def get_cell_owner(state, board_r, board_c, pos_r, pos_c):
-    board_index = 3 * board_r + board_c
-    p1_bitmask = state[2*board_index]
-    p2_bitmask = state[2*board_index+1]
-    is_p1 = (p1_bitmask & positions[(pos_r, pos_c)]) > 0
-    is_p2 = (p2_bitmask & positions[(pos_r, pos_c)]) > 0
-    if is_p1:
-        return 1
-    if is_p2:
-        return 2
-    return 0
-
-def rollout(board: Board, state, bot_identity: int):
-    """ Given the state of the game, the rollout plays out the remainder randomly.
+    global BEST_CELL, BEST_SCORE
+    best_cell = array('b', bytes(1 << 18))
+    best_score = array('b', bytes(1 << 18))
+    for mover_mask in range(0x200):
+        free = 0x1ff & ~mover_mask
+        # every other_mask that does not overlap mover_mask, i.e. every subset of the free squares
+        other_mask = free
+        while True:
+            best = -9
+            for cell in range(9):
+                bit = 1 << cell
+                if not (mover_mask | other_mask) & bit:
+                    score = get_heuristic(mover_mask | bit, other_mask)
+                    if score > best:
+                        best = score
+                        best_cell[mover_mask << 9 | other_mask] = cell
+            best_score[mover_mask << 9 | other_mask] = best
+            if not other_mask:
+                break
+            other_mask = (other_mask - 1) & free
+    BEST_CELL, BEST_SCORE = best_cell, best_score
+
+
+def rollout(board: Board, state):
+    """ Given the state of the game, the rollout plays out the remainder, with each player greedily taking the
+    move that scores best for itself on the sub-board it plays in.
 
     Args:
         board:  The game setup.
@@ -177,112 +89,44 @@ def rollout(board: Board, state, bot_identity: int):
         state: The terminal game state
 
     """
-    # for action in actions:
-    # new_state = board.next_state(state, action)
-    # if board.is_ended(new_state) and is_win(board, new_state, bot_identity):
-    #     return new_state
-
-    # get a random legal action
-    # get new state from action
-    # repeat until game ends
-    # h(x)
-    # rows x can win - rows o can win
-    # if x wins a row, +inf
-    # if lose, -inf    
+    if BEST_CELL is None:
+        _build_move_tables()
+    best_cell = BEST_CELL
+    best_score = BEST_SCORE
+    next_state = board.next_state
+    # the players alternate, so whose turn it is only has to be read from the state once and then toggled
+    mover_offset = board.current_player(state) - 1
+    other_offset = 1 - mover_offset
     while not board.is_ended(state):
-        actions = board.legal_actions(state)
-        best_score = float('-inf')
-        best_action = None
-        for action in actions:
-            next_state = board.next_state(state, action)
-            # get smaller board
-            board_row = action[0]
-            board_col = action[1]
-
-            b = {(0,0): get_cell_owner(next_state, board_row, board_col, 0, 0), 
-                  (0,1): get_cell_owner(next_state, board_row, board_col, 0, 1), 
-                  (0,2): get_cell_owner(next_state, board_row, board_col, 0, 2), 
-                  (1,0): get_cell_owner(next_state, board_row, board_col, 1, 0), 
-                  (1,1): get_cell_owner(next_state, board_row, board_col, 1, 1), 
-                  (1,2): get_cell_owner(next_state, board_row, board_col, 1, 2), 
-                  (2,0): get_cell_owner(next_state, board_row, board_col, 2, 0), 
-                  (2,1): get_cell_owner(next_state, board_row, board_col, 2, 1), 
-                  (2,2): get_cell_owner(next_state, board_row, board_col, 2, 2)}
-
-            # print(board.owned_boxes(next_state))
-            score = get_heuristic(b, bot_identity)
-            if score > best_score:
-                best_action = action
-                best_score = score
-            
-        # print("SCORE: ", best_score)
-        state = board.next_state(state, best_action)
+        if state[20] is not None:
+            # forced into one sub-board, whose best square is a single lookup
+            best_board = 3 * state[20] + state[21]
+            key = state[2 * best_board + mover_offset] << 9 | state[2 * best_board + other_offset]
+        else:
+            # free to play anywhere: the best square of each open sub-board, in the order Board.legal_actions
+            # lists them, so the first of equally scored moves is still the one taken
+            finished = state[18] | state[19]
+            best = -9
+            for sub_board in range(9):
+                if not finished >> sub_board & 1:
+                    sub_key = state[2 * sub_board + mover_offset] << 9 | state[2 * sub_board + other_offset]
+                    if best_score[sub_key] > best:
+                        best = best_score[sub_key]
+                        best_board = sub_board
+                        key = sub_key
+                        # a square that completes a line scores the maximum and cannot be beaten
+                        if best == 8:
+                            break
+        board_row, board_col = divmod(best_board, 3)
+        row, col = divmod(best_cell[key], 3)
+        state = next_state(state, (board_row, board_col, row, col))
+        mover_offset, other_offset = other_offset, mover_offset
     return state
 
 
-def backpropagate(node: MCTSNode | None, won: bool):
-    """ Navigates the tree from a leaf node to the root, updating the win and visit count of each node along the path.
-
-    Args:
-        node:   A leaf node.
-        won:    An indicator of whether the bot won or lost the game.
-
-    """
-    while node is not None:
-        node.visits += 1
-        if won:
-            node.wins += 1
-        node = node.parent
-
-
-def ucb(node: MCTSNode, is_opponent: bool):
-    """ Calculates the UCB value for the given node from the perspective of the bot
-
-    Args:
-        node:   A node.
-        is_opponent: A boolean indicating whether or not the last action was performed by the MCTS bot
-    Returns:
-        The value of the UCB function for the given node
-    """
-    if not node.parent:
-        return 0
-    visits = node.visits
-    wins = node.wins if not is_opponent else visits - node.wins
-    total_visits = node.parent.visits
-    exploitation_factor = (wins / visits)
-    exploration_factor = explore_faction * sqrt(log(total_visits, e) / visits)
-    value = exploitation_factor + exploration_factor
-    return value
-
-
-def get_best_action(root_node: MCTSNode):
-    """ Selects the best action from the root node in the MCTS tree
-
-    Args:
-        root_node:   The root node
-    Returns:
-        action: The best action from the root node
-    
-    """
-    best_action = None
-    best_score = float('-inf')
-    for action, node in root_node.child_nodes.items():
-        score = node.wins / node.visits
-        if score > best_score:
-            best_score = score
-            best_action = action
-    return best_action
-
-
-def is_win(board: Board, state, identity_of_bot: int):
-    # checks if state is a win state for identity_of_bot
-    outcome = board.points_values(state)
-    assert outcome is not None, "is_win was called on a non-terminal state"
-    return outcome[identity_of_bot] == 1
-
-
 def think(board: Board, current_state):
-    """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
+    """ Performs MCTS with greedy heuristic rollouts, using the search settings of this module. See
+    mcts_search.search.
 
     Args:
         board:  The game setup.
@@ -291,31 +135,5 @@ def think(board: Board, current_state):
     Returns:    The action to be taken from the current state
 
     """
-    bot_identity = board.current_player(current_state)  # 1 or 2
-    root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(current_state))
-
-    for _ in range(num_nodes):
-        node = root_node
-        best_unexpanded_node, state = traverse_nodes(node, board, current_state, bot_identity)
-        next_node, next_state = expand_leaf(best_unexpanded_node, board, state)
-        terminal_state = rollout(board, next_state, bot_identity)
-        win = is_win(board, terminal_state, bot_identity)
-        backpropagate(next_node, win)
-
-        # print("next node: ", best_unexpended_node, " state: ", state)
-
-        # child_node, state = expand_leaf(best_unexpended_node, state)
-
-        # Do MCTS - This is all you!
-        # ...
-
-    # Return an action, typically the most frequently used action (from the root) or the action with the best
-    # estimated win rate.
-    best_action = get_best_action(root_node)
-    # temp_state = board.next_state(state, best_action)
-    # board_state = board.owned_boxes(temp_state)
-    # h = get_heuristic(board_state, bot_identity)
-    # print("Heristic: ", h)
-
-    # print(f"Action chosen: {best_action}")
-    return best_action
+    return search(board, current_state, rollout, num_nodes, explore_faction, num_workers=num_workers,
+                  think_time=think_time, reuse_tree=reuse_tree)
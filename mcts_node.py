@@ -1,7 +1,11 @@
 
 
 class MCTSNode:
-    def __init__(self, parent=None, parent_action=None, action_list=[]):
+    # Fixed attribute slots keep the many nodes of a search small and make attribute access a direct offset load.
+    __slots__ = ('parent', 'parent_action', 'child_nodes', 'child_list', 'child_wins', 'child_visits',
+                 'untried_actions', 'state', 'total_wins', 'total_visits')
+
+    def __init__(self, parent=None, parent_action=None, action_list=[], state=None):
         """ Initializes the tree node for MCTS. The node stores links to other nodes in the tree (parent and child
         nodes), as well as keeps track of the number of wins and total simulations that have visited the node.
 
@@ -9,16 +13,48 @@ class MCTSNode:
             parent:         The parent node of this node.
             parent_action:  The action taken from the parent node that transitions the state to this node.
             action_list:    The list of legal actions to be considered at this node.
+            state:          The game state this node represents, cached so the tree walk never has to replay moves.
 
         """
-        self.parent = parent                    # Parent node to this node
+        self.parent = parent                    # Parent node this node was first expanded from
         self.parent_action = parent_action      # The move that got us to this node - "None" for the root node.
 
         self.child_nodes = {}                   # Action -> MCTSNode dictionary of children
+        # The children's statistics live on the parent as parallel lists, so selection can scan the siblings
+        # without loading every child object.
+        self.child_list = []                    # Children in the order they were expanded
+        # Counted per edge: a child shared with another parent has its own counts there.
+        self.child_wins = []                    # child_wins[i] is the win count of the edge to child_list[i]
+        self.child_visits = []                  # child_visits[i] is the visit count of the edge to child_list[i]
         self.untried_actions = action_list      # Yet unexplored actions
+        self.state = state                      # Game state reached through parent_action
+
+        self.total_wins = 0                     # Wins and visits through any of the node's parents, which
+        self.total_visits = 0                   # are also the statistics of a root
+
+    @property
+    def wins(self):
+        """ Total wins of all paths through this node. """
+        return self.total_wins
+
+    @property
+    def visits(self):
+        """ Number of times this node has been visited, through any of its parents. """
+        return self.total_visits
 
-        self.wins = 0                           # Total wins of all paths through this node.
-        self.visits = 0                         # Number of times this node has been visited.
+    def add_child(self, action, child):
+        """ Links a child to this node and gives the new edge empty statistics. The child may already belong to
+        another parent when a transposition reaches its state a second way.
+
+        Args:
+            action: The action that transitions the state of this node to the child.
+            child:  The child node.
+
+        """
+        self.child_nodes[action] = child
+        self.child_list.append(child)
+        self.child_wins.append(0)
+        self.child_visits.append(0)
 
     def __repr__(self):
         """
@@ -0,0 +1,421 @@
+import atexit
+import os
+from multiprocessing import get_context
+from mcts_node import MCTSNode
+from p2_t3 import Board
+from random import randrange, seed
+from math import sqrt, log
+from time import perf_counter
+
+# Search iterations between checks of whether the best move of a timed search can still change.
+CHECK_INTERVAL = 64
+_pool = None    # Worker pool, created on the first parallel search and rebuilt when num_workers changes
+_pool_size = 0
+_previous_roots = {}    # (rollout, bot identity) -> root of the last sequential search
+
+# sqrt(log(n)) and 1 / sqrt(n) for small visit counts, so the UCB exploration term is two list loads instead of two
+# libm calls for nearly every node of a search. Index 0 is never read for visits; it is kept to index by count.
+TABLE_SIZE = 4096
+SQRT_LOG_TABLE = [0.0] + [sqrt(log(n)) for n in range(1, TABLE_SIZE)]
+INV_SQRT_TABLE = [0.0] + [1 / sqrt(n) for n in range(1, TABLE_SIZE)]
+
+
+def traverse_nodes(node: MCTSNode, board: Board, state, bot_identity: int, explore_faction: float):
+    """ Traverses the tree until the end criterion are met.
+    e.g. find the best expandable node (node with untried action) if it exist,
+    or else a terminal node
+
+    Args:
+        node:       A tree node from which the search is traversing.
+        board:      The game setup.
+        state:      The state of the game.
+        bot_identity:   The bot's identity, either 1 or 2
+        explore_faction:    The weight of the exploration term of UCB
+
+    Returns:
+        node: A node from which the next stage of the search can proceed.
+        state: The state associated with that node
+        path: The (parent, child index) edges walked to reach that node
+
+    """
+
+    # from lecture slides: Walk the game tree picking child nodes with the highest value of this formula. Return a node with untried actions to expand.
+    # stopping criteria: no node has untried actions OR game has ended
+    is_opponent = board.current_player(state) != bot_identity
+    path = []
+    while node is not None:
+        # for each node,
+        # find expandable node
+        # else find the child with the UBC highest value,
+        # and traverse that child
+
+        # node with possible actions, or a terminal node
+        if node.untried_actions or not node.child_nodes:
+            return node, state, path
+
+        best_index = 0
+        best_score = float('-inf')
+        # the node's own total rather than the count of the edge just walked, since a shared node's children
+        # also carry the visits that reached it through its other parents
+        parent_visits = node.total_visits
+        if parent_visits < TABLE_SIZE:
+            exploration = explore_faction * SQRT_LOG_TABLE[parent_visits]
+        else:
+            exploration = explore_faction * sqrt(log(parent_visits))
+        child_wins = node.child_wins
+        # the UCB formula is inlined here, with one loop per side so the opponent flip is not re-tested per child
+        if is_opponent:
+            # the opponent picks the child that is worst for the bot
+            for i, visits in enumerate(node.child_visits):
+                inv_sqrt = INV_SQRT_TABLE[visits] if visits < TABLE_SIZE else 1 / sqrt(visits)
+                score = (visits - child_wins[i]) / visits + exploration * inv_sqrt
+                if score > best_score:
+                    best_score = score
+                    best_index = i
+        else:
+            for i, visits in enumerate(node.child_visits):
+                inv_sqrt = INV_SQRT_TABLE[visits] if visits < TABLE_SIZE else 1 / sqrt(visits)
+                score = child_wins[i] / visits + exploration * inv_sqrt
+                if score > best_score:
+                    best_score = score
+                    best_index = i
+        path.append((node, best_index))
+        node = node.child_list[best_index]
+        state = node.state
+        is_opponent = not is_opponent
+
+    return node, state, path
+
+
+def expand_leaf(node: MCTSNode, board: Board, state, path: list, transpositions: dict):
+    """ Adds a new leaf to the tree by creating a new child node for the given node (if it is non-terminal).
+
+    Args:
+        node:   The node for which a child will be added.
+        board:  The game setup.
+        state:  The state of the game.
+        path:   The edges walked to reach node; the edge to the new leaf is appended.
+        transpositions: State -> MCTSNode dictionary of the tree, so a state reached by another move order is
+                        linked to its existing node instead of growing a duplicate subtree.
+
+    Returns:
+        node: The added child node, or the given node itself if it is terminal
+        state: The state associated with that node
+
+    """
+    # check that node is non-terminal
+    untried_actions = node.untried_actions
+    if untried_actions:
+        # take a random untried action by moving the last one into its slot, so removal is O(1)
+        i = randrange(len(untried_actions))
+        action = untried_actions[i]
+        untried_actions[i] = untried_actions[-1]
+        untried_actions.pop()
+        new_state = board.next_state(state, action)
+        child = transpositions.get(new_state)
+        if child is None:
+            child_actions = board.legal_actions(new_state)
+            child = MCTSNode(parent=node, parent_action=action, action_list=child_actions, state=new_state)
+            transpositions[new_state] = child
+        path.append((node, len(node.child_list)))
+        node.add_child(action, child)
+        return child, new_state
+    # a terminal node is its own leaf, so the result of the finished game is still backpropagated
+    return node, state
+
+
+def backpropagate(root_node: MCTSNode, path: list, visits: int, wins: int):
+    """ Navigates the path from the root to a leaf node, updating the win and visit count of each node along it.
+
+    The statistics are kept on the edges walked rather than by following parent links, since a transposed node
+    can be reached from more than one parent. Each node on the path also counts them in its own totals.
+
+    Args:
+        root_node:  The root node of the search.
+        path:   The (parent, child index) edges from the root to the leaf.
+        visits: The number of rollouts played from the leaf.
+        wins:   How many of those rollouts the bot won.
+
+    """
+    node = root_node
+    for parent, index in path:
+        parent.total_visits += visits
+        parent.total_wins += wins
+        parent.child_visits[index] += visits
+        parent.child_wins[index] += wins
+        node = parent.child_list[index]
+    node.total_visits += visits
+    node.total_wins += wins
+
+
+def ucb(parent: MCTSNode, index: int, is_opponent: bool, explore_faction: float):
+    """ Calculates the UCB value of a child edge from the perspective of the bot. This is the reference form of the
+    formula that traverse_nodes inlines with table lookups; the search itself does not call it.
+
+    Args:
+        parent: The node the edge leaves from.
+        index:  The index of the child in the parent's child lists.
+        is_opponent: A boolean indicating whether or not the opponent of the bot picks the child
+        explore_faction:    The weight of the exploration term of UCB
+
+    Returns:
+        The value of the UCB function for the given child
+
+    """
+    visits = parent.child_visits[index]
+    wins = parent.child_wins[index] if not is_opponent else visits - parent.child_wins[index]
+    return wins / visits + explore_faction * sqrt(log(parent.total_visits) / visits)
+
+
+def get_best_action(root_node: MCTSNode):
+    """ Selects the best action from the root node in the MCTS tree
+
+    Args:
+        root_node:   The root node
+    Returns:
+        action: The best action from the root node
+    
+    """
+    # the most visited child: UCB already steers visits toward the best win rate, and unlike a raw win rate this
+    # cannot be won by a child that got lucky on a handful of rollouts
+    child_visits = root_node.child_visits
+    best_index = max(range(len(child_visits)), key=child_visits.__getitem__)
+    return root_node.child_list[best_index].parent_action
+
+
+def _is_decided(root_node: MCTSNode, remaining_visits: float):
+    """ Checks whether the most visited child of the root can still be overtaken.
+
+    Args:
+        root_node:  The root node of the search.
+        remaining_visits:   How many more rollouts the search expects to run.
+
+    Returns:    True if the lead of the most visited child is larger than the rollouts left to spend
+
+    """
+    visits = sorted(root_node.child_visits, reverse=True)[:2]
+    runner_up = visits[1] if len(visits) > 1 else 0
+    return visits[0] - runner_up > remaining_visits
+
+
+def is_win(board: Board, state, identity_of_bot: int):
+    # checks if state is a win state for identity_of_bot
+    outcome = board.points_values(state)
+    assert outcome is not None, "is_win was called on a non-terminal state"
+    return outcome[identity_of_bot] == 1
+
+
+def _index_states(root_node: MCTSNode):
+    """ Builds the transposition dictionary of a tree.
+
+    Args:
+        root_node:  The root node of the tree.
+
+    Returns:    A state -> MCTSNode dictionary of every node reachable from root_node
+
+    """
+    transpositions = {}
+    stack = [root_node]
+    while stack:
+        node = stack.pop()
+        if node.state not in transpositions:
+            transpositions[node.state] = node
+            stack.extend(node.child_list)
+    return transpositions
+
+
+def _find_subtree(previous_root: MCTSNode, current_state):
+    """ Looks for the current state two moves below the root of the bot's previous search, i.e. after its own move
+    and the opponent's reply, and detaches it so the search can continue from it. Every node below it is
+    re-parented inside the reused subtree, so none of them keeps pointing into the discarded rest of the tree.
+
+    Args:
+        previous_root:  The root node of the previous search.
+        current_state:  The current state of the game.
+
+    Returns:    The node of the current state as a new root, or None if the previous search never expanded it
+
+    """
+    for child in previous_root.child_list:
+        for grandchild in child.child_list:
+            if grandchild.state == current_state:
+                # its own totals, counted over all its parents, become the statistics of the new root
+                grandchild.parent = None
+                grandchild.parent_action = None
+                # the first edge found to each node becomes its parent link
+                seen = {grandchild.state}
+                stack = [grandchild]
+                while stack:
+                    node = stack.pop()
+                    for action, child in node.child_nodes.items():
+                        if child.state not in seen:
+                            seen.add(child.state)
+                            child.parent = node
+                            child.parent_action = action
+                            stack.append(child)
+                return grandchild
+    return None
+
+
+def build_tree(board: Board, current_state, rollout, iterations: int, explore_faction: float,
+               rollouts_per_leaf=1, time_limit=None, root_node=None):
+    """ Grows an MCTS tree from the current state by running the given number of search iterations, or for the
+    given number of seconds. A timed search also stops early once the most visited child of the root can no longer
+    be overtaken in the time that is left.
+
+    Args:
+        board:  The game setup.
+        current_state:  The current state of the game.
+        rollout:    The bot's rollout policy, taking (board, state) and returning a terminal state.
+        iterations: The number of rollouts to spend on the tree.
+        explore_faction:    The weight of the exploration term of UCB.
+        rollouts_per_leaf:  How many rollouts to play from each expanded leaf.
+        time_limit: Seconds to search for. If given, it replaces the iteration budget.
+        root_node:  A tree of the current state to keep growing, instead of starting a new one.
+
+    Returns:    The root node of the tree
+
+    """
+    bot_identity = board.current_player(current_state)  # 1 or 2
+    if root_node is None:
+        root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(current_state),
+                             state=current_state)
+    transpositions = _index_states(root_node)
+
+    # Rollouts never touch the tree, so each expanded leaf can be sampled rollouts_per_leaf times and the results
+    # backpropagated together, spending the iterations on fewer tree walks.
+    start = perf_counter()
+    deadline = None if time_limit is None else start + time_limit
+    # rounded up, and at least one tree walk, so a budget smaller than rollouts_per_leaf, e.g. one split over
+    # more workers than it has iterations, still yields a move
+    limit = max(1, -(-iterations // rollouts_per_leaf))
+    iteration = 0
+    while True:
+        if deadline is None:
+            if iteration >= limit:
+                break
+        elif iteration:
+            # the clock is read before every tree walk, so a short think_time is not overshot
+            now = perf_counter()
+            if now >= deadline:
+                break
+            if not iteration % CHECK_INTERVAL:
+                # extrapolated from the pace of the search so far
+                remaining = iteration * (deadline - now) / (now - start)
+                if _is_decided(root_node, remaining * rollouts_per_leaf):
+                    break
+        iteration += 1
+
+        node = root_node
+        best_unexpanded_node, state, path = traverse_nodes(node, board, current_state, bot_identity,
+                                                           explore_faction)
+        next_node, next_state = expand_leaf(best_unexpanded_node, board, state, path, transpositions)
+        wins = 0
+        for _ in range(rollouts_per_leaf):
+            terminal_state = rollout(board, next_state)
+            if is_win(board, terminal_state, bot_identity):
+                wins += 1
+        backpropagate(root_node, path, rollouts_per_leaf, wins)
+    return root_node
+
+
+def _root_statistics(job):
+    """ Worker entry point for root-parallel search: grows an independent tree and reports its root's children.
+
+    Args:
+        job:    A (rng_seed, board, current_state, *build_tree arguments) tuple, packed into one argument for
+                Pool.map. The rollout is sent by reference, so it has to be a module-level function.
+
+    Returns:    An action -> visits dictionary for the children of the worker's root
+
+    """
+    rng_seed, *arguments = job
+    seed(rng_seed)
+    root_node = build_tree(*arguments)
+    return dict(zip(root_node.child_nodes, root_node.child_visits))
+
+
+def _close_pool():
+    """ Stops the worker pool, if there is one. """
+    global _pool, _pool_size
+    if _pool is not None:
+        _pool.terminate()
+    _pool, _pool_size = None, 0
+
+
+def _get_pool(workers: int):
+    """ Returns a pool of the given number of worker processes, replacing the current one if its size differs.
+
+    The workers are forked rather than spawned: p2_sim and p2_play play their games at module level, so a spawned
+    worker re-importing the main script would start playing, and searching, itself.
+
+    Args:
+        workers:    The number of worker processes.
+
+    Returns:    The worker pool
+
+    """
+    global _pool, _pool_size
+    if _pool is None or _pool_size != workers:
+        try:
+            context = get_context('fork')
+        except ValueError:
+            raise RuntimeError("root-parallel search needs the 'fork' start method, which this platform does not "
+                               "have; set num_workers = 1") from None
+        if _pool is None:
+            atexit.register(_close_pool)
+        else:
+            _pool.terminate()
+        _pool, _pool_size = context.Pool(workers), workers
+    return _pool
+
+
+def search(board: Board, current_state, rollout, num_nodes: int, explore_faction: float, rollouts_per_leaf=1,
+           num_workers=1, think_time=None, reuse_tree=True):
+    """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
+
+    The search runs for think_time seconds if it is set, and for num_nodes iterations otherwise. With reuse_tree, a
+    sequential search continues the subtree of the current state from the bot's previous search when there is one.
+    With num_workers above 1, the iterations are split over that many processes that each grow their own tree from
+    the current state for the whole think_time, and the root statistics of all the trees are summed before choosing.
+
+    Args:
+        board:  The game setup.
+        current_state:  The current state of the game.
+        rollout:    The bot's rollout policy, a module-level function taking (board, state) and returning a
+                    terminal state.
+        num_nodes:  The number of rollouts to spend on the move.
+        explore_faction:    The weight of the exploration term of UCB.
+        rollouts_per_leaf:  How many rollouts to play from each expanded leaf.
+        num_workers:    Processes for root-parallel search. 1 keeps the whole search in the calling process.
+        think_time: Seconds to search for. None spends num_nodes iterations instead.
+        reuse_tree: Whether to continue from the tree of the bot's previous move.
+
+    Returns:    The action to be taken from the current state
+
+    """
+    workers = min(num_workers, os.cpu_count() or 1)
+    if workers > 1:
+        jobs = [(randrange(2 ** 32), board, current_state, rollout, num_nodes // workers, explore_faction,
+                 rollouts_per_leaf, think_time)
+                for _ in range(workers)]
+        totals = {}
+        for root_statistics in _get_pool(workers).map(_root_statistics, jobs):
+            for action, visits in root_statistics.items():
+                totals[action] = totals.get(action, 0) + visits
+        # the most visited action over all the trees, as get_best_action picks for a single tree
+        return max(totals, key=totals.__getitem__)
+
+    # keyed by rollout and identity, since both bots share this module and one bot may be playing both sides
+    key = (rollout, board.current_player(current_state))
+    root_node = None
+    if reuse_tree and key in _previous_roots:
+        # dropped first, so a tree that cannot be reused, e.g. from the previous game, is freed before searching
+        root_node = _find_subtree(_previous_roots.pop(key), current_state)
+    root_node = build_tree(board, current_state, rollout, num_nodes, explore_faction, rollouts_per_leaf,
+                           think_time, root_node)
+    _previous_roots[key] = root_node
+
+    # Return the most frequently used action from the root
+    best_action = get_best_action(root_node)
+    return best_action
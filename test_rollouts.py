@@ -0,0 +1,78 @@
+import random
+import unittest
+from unittest import mock
+
+import mcts_modified
+import mcts_vanilla
+from p2_t3 import Board
+
+
+def random_positions(board, count, rng):
+    """ Yields non-terminal states reached by random play from the starting state. """
+    while count:
+        state = board.starting_state()
+        for _ in range(rng.randrange(60)):
+            if board.is_ended(state):
+                break
+            state = board.next_state(state, rng.choice(board.legal_actions(state)))
+        if not board.is_ended(state):
+            count -= 1
+            yield state
+
+
+class VanillaRolloutTest(unittest.TestCase):
+    """ The vanilla rollout inlines the move rules of Board on a mutable bitboard, so it is replayed against
+    Board move by move. """
+
+    def test_moves_and_terminal_state_match_board(self):
+        board = Board()
+        rng = random.Random(0)
+        for state in random_positions(board, 300, rng):
+            shadow = [state]
+
+            def choose(moves):
+                # the moves offered, encoded as 9 * sub-board + square, must be exactly the legal actions
+                legal = {(R, C, r, c): 9 * (3 * R + C) + 3 * r + c for R, C, r, c in board.legal_actions(shadow[0])}
+                self.assertEqual(sorted(moves), sorted(legal.values()))
+                move = rng.choice(moves)
+                action = next(action for action, encoded in legal.items() if encoded == move)
+                shadow[0] = board.next_state(shadow[0], action)
+                return move
+
+            with mock.patch.object(mcts_vanilla, 'choice', choose):
+                terminal_state = mcts_vanilla.rollout(board, state)
+            self.assertEqual(terminal_state, shadow[0])
+            self.assertTrue(board.is_ended(terminal_state))
+
+
+def greedy_rollout(board, state):
+    """ The greedy rollout written out on Board: each player takes the first legal action that scores best for it
+    with get_heuristic on the sub-board it plays in. """
+    while not board.is_ended(state):
+        mover = board.current_player(state)
+        best_score = None
+        for action in board.legal_actions(state):
+            R, C, r, c = action
+            index = 2 * (3 * R + C)
+            score = mcts_modified.get_heuristic(state[index + mover - 1] | 1 << (3 * r + c),
+                                                state[index + 2 - mover])
+            if best_score is None or score > best_score:
+                best_score = score
+                best_action = action
+        state = board.next_state(state, best_action)
+    return state
+
+
+class ModifiedRolloutTest(unittest.TestCase):
+    """ The greedy rollout picks its moves from the precomputed BEST_CELL and BEST_SCORE tables, so it is compared
+    with scoring every legal action. """
+
+    def test_table_moves_match_heuristic_argmax(self):
+        board = Board()
+        rng = random.Random(1)
+        for state in random_positions(board, 300, rng):
+            self.assertEqual(mcts_modified.rollout(board, state), greedy_rollout(board, state))
+
+
+if __name__ == '__main__':
+    unittest.main()
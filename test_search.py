@@ -0,0 +1,49 @@
+import random
+import unittest
+
+import mcts_search
+from mcts_node import MCTSNode
+from p2_t3 import Board
+
+
+def make_root(board, rng, low, high):
+    """ Builds a root of the starting state whose children are all expanded, with random edge statistics between
+    low and high visits. Each child keeps an untried action, so a walk stops right below the root. """
+    state = board.starting_state()
+    root = MCTSNode(action_list=[], state=state)
+    for action in board.legal_actions(state):
+        child = MCTSNode(parent=root, parent_action=action, action_list=[None], state=board.next_state(state, action))
+        root.add_child(action, child)
+        visits = rng.randint(low, high)
+        root.child_visits[-1] = visits
+        root.child_wins[-1] = rng.randint(0, visits)
+    root.total_visits = sum(root.child_visits)
+    return root
+
+
+class SelectionTest(unittest.TestCase):
+    """ traverse_nodes inlines UCB with lookup tables for small visit counts, so its choice is compared with the
+    reference ucb for both sides, below and at or above TABLE_SIZE. """
+
+    def check_selection(self, low, high):
+        board = Board()
+        rng = random.Random(2)
+        for _ in range(200):
+            root = make_root(board, rng, low, high)
+            # the starting state is player 1's turn, so bot 1 picks the child and bot 2 sees its opponent pick it
+            for bot_identity, is_opponent in ((1, False), (2, True)):
+                node, state, path = mcts_search.traverse_nodes(root, board, root.state, bot_identity, 2.)
+                expected = max(range(len(root.child_list)),
+                               key=lambda i: mcts_search.ucb(root, i, is_opponent, 2.))
+                self.assertEqual(path, [(root, expected)])
+                self.assertIs(node, root.child_list[expected])
+
+    def test_small_visit_counts_match_ucb(self):
+        self.check_selection(1, 40)
+
+    def test_large_visit_counts_match_ucb(self):
+        self.check_selection(mcts_search.TABLE_SIZE, 5 * mcts_search.TABLE_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()